@@ -1,15 +1,27 @@
 import streamlit as st
 from google import genai
 from google.genai import types
+import io
 import os
+import queue
+import time
+from datetime import timedelta
 from dotenv import load_dotenv
 import json
+import orjson
+import pyarrow as pa
 import base64
+import hashlib
 import re
+import subprocess
+import tempfile
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import accumulate, groupby
+from PIL import Image
 import fitz  # PyMuPDF
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 import streamlit.components.v1 as components
-import graphviz
 
 # Load API Key from .env file
 load_dotenv()
@@ -33,378 +45,677 @@ Upload a PDF of a scientific paper to extract and reconstruct a metabolic pathwa
 This tool uses Google's Gemini 2.5 Flash model to generate a structured JSON model and a plain-language explanation.
 """)
 
+_PREFIX_RE = re.compile(r'^\d+[\.,]\d+-')
+_SYNTH_RE = re.compile(r'\(.*?synthetic.*?\)', re.IGNORECASE)
+
+# Explanation cleanup: the JSON block, then the deliverable headers the prompt asks for
+_JSON_BLOCK_RE = re.compile(r'```json\n.*?\n```', re.DOTALL)
+_HEADER_RE = re.compile(
+    r'### Final Deliverables\s*'
+    r'|\d+\.\s*\*\*JSON metabolic pathway model\*\*\s*'
+    r'|\d+\.\s*\*\*Plain-language explanation\*\*.*?\n'
+    r'|### Plain-Language Explanation.*?\n',
+    re.IGNORECASE
+)
+
 def smart_clean_name(name):
     """Cleans up chemical names by removing common prefixes/suffixes."""
-    name = re.sub(r'^\d+[\.,]\d+-', '', name)
-    name = re.sub(r'\(.*?synthetic.*?\)', '', name, flags=re.IGNORECASE)
-    return name.strip()
+    return _SYNTH_RE.sub('', _PREFIX_RE.sub('', name)).strip()
+
+# Highlight colors for evidence by reaction certainty (lowercased)
+# Confirmed = Yellow, Hypothetical = Orange; anything else is shown as confirmed
+_CERTAINTY_COLORS = {
+    "confirmed": "rgba(255, 255, 0, 0.4)",
+    "hypothetical": "rgba(255, 165, 0, 0.5)",
+}
+_CONFIRMED_COLOR = _CERTAINTY_COLORS["confirmed"]
 
-def find_text_fuzzy(pdf_bytes, text_quotes, threshold=85):
+# Word extraction flags, chosen so page text compares well with the model's quotes:
+# words hyphenated across a line break are joined back together, ligatures such as "ﬁ"
+# are expanded to plain letters (by leaving out TEXT_PRESERVE_LIGATURES), and text
+# outside the visible page is ignored
+_WORD_FLAGS = fitz.TEXT_DEHYPHENATE | fitz.TEXT_MEDIABOX_CLIP
+
+def _digest(data):
+    """Short content hash used to key caches on PDF bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# Parsing is the expensive part of the evidence search, so each PDF is parsed once per
+# process and reused by every quote set, tab and rerun (the result is never mutated)
+@st.cache_resource(max_entries=8, show_spinner=False, hash_funcs={bytes: _digest})
+def _extract_pages(pdf_bytes):
     """
-    Finds text in PDF using fuzzy matching and returns annotations.
+    Extracts the words of every PDF page once.
+    Returns one (words, text, word_starts) tuple per page: PyMuPDF's word tuples
+    (x0, y0, x1, y1, "word", block_no, line_no, word_no), the lowercased words joined
+    by single spaces, and the character offset at which each word starts in that text.
+    """
+    pages = []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page in doc:
+            # Content-stream order is fine for matching, so skip PyMuPDF's positional sort
+            words = page.get_text("words", flags=_WORD_FLAGS, sort=False)
+            word_texts_lower = [w[4].lower() for w in words]
+            word_starts = list(accumulate((len(t) + 1 for t in word_texts_lower[:-1]), initial=0))
+            pages.append((words, " ".join(word_texts_lower), word_starts))
+    return pages
+
+def find_text_fuzzy(pages, text_quotes, threshold=85):
+    """
+    Finds text in the pages returned by _extract_pages using fuzzy matching and returns annotations.
+    text_quotes holds (quote, color) pairs; bare strings get the confirmed color.
     """
     annotations = []
-    # Normalize queries to list of dicts
-    normalized_queries = []
+    # Normalize queries to (quote, lowercased cleaned quote, color) once up front
+    queries = []
     for q in text_quotes:
         if isinstance(q, str):
-            normalized_queries.append({'text': q, 'color': "rgba(255, 255, 0, 0.4)"})
-        elif isinstance(q, dict):
-            normalized_queries.append(q)
+            quote, color = q, _CONFIRMED_COLOR
+        elif isinstance(q, tuple):
+            quote, color = q
+        else:
+            continue
+        
+        # Clean quote
+        quote_clean = re.sub(r'\s+', ' ', quote).strip()
+        if len(quote_clean) < 5: continue # Skip very short quotes
+        queries.append((quote, quote_clean.lower(), color))
 
-    try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        for page_num, page in enumerate(doc):
-            words = page.get_text("words") # list of (x0, y0, x1, y1, "word", block_no, line_no, word_no)
-            
-            for query_item in normalized_queries:
-                quote = query_item['text']
-                color = query_item.get('color', "rgba(255, 255, 0, 0.4)")
-                
-                # Clean quote
-                quote_clean = re.sub(r'\s+', ' ', quote).strip()
-                if len(quote_clean) < 5: continue # Skip very short quotes
-                
-                # Reconstruct full text from words to run fuzzy match
-                full_text = " ".join([w[4] for w in words])
-                
-                # Use rapidfuzz to find the best partial match
-                # partial_ratio is good for finding a substring
-                score = fuzz.partial_ratio(quote_clean.lower(), full_text.lower())
-                
-                if score >= threshold:
-                    # Now we need to find *where* in the words list this match occurred.
-                    # This is tricky with simple string matching. 
-                    # A robust way is to slide a window of words and check similarity.
-                    
-                    quote_word_count = len(quote_clean.split())
-                    # We'll check windows of varying sizes around the expected length
-                    
-                    best_window_score = 0
-                    best_window_indices = None
-                    
-                    # Optimization: Only check windows if the page score is high enough
-                    for i in range(len(words)):
-                        # Check windows of varying sizes around the expected length
-                        for window_size in range(max(1, quote_word_count - 2), quote_word_count + 5):
-                            if i + window_size > len(words):
-                                break
-                                
-                            window_text = " ".join([w[4] for w in words[i:i+window_size]])
-                            window_score = fuzz.ratio(quote_clean.lower(), window_text.lower())
-                            
-                            if window_score > best_window_score:
-                                best_window_score = window_score
-                                best_window_indices = (i, i + window_size)
-                    
-                    if best_window_score >= threshold:
-                        start_idx, end_idx = best_window_indices
-                        matched_words = words[start_idx:end_idx]
-                        
-                        # Create a bounding box for the whole match (or per line)
-                        # For simplicity, let's create boxes for each word to ensure wrapping works
-                        for w in matched_words:
-                            annotations.append({
-                                "page": page_num + 1,
-                                "x": w[0],
-                                "y": w[1],
-                                "width": w[2] - w[0],
-                                "height": w[3] - w[1],
-                                "color": color, 
-                                "quote": quote # Store quote for reference
-                            })
-                            
-    except Exception as e:
-        st.warning(f"Error in fuzzy search: {e}")
+    if not queries:
+        return annotations
+    
+    def add_match(page_num, words, word_starts, match_start, match_end, quote, color):
+        # Map the matched character span back to word indices
+        start_idx = bisect_right(word_starts, match_start) - 1
+        end_idx = bisect_left(word_starts, match_end)
+        matched_words = words[start_idx:end_idx]
         
+        # Create one bounding box per line of the match so wrapped quotes still
+        # highlight correctly without a box (and DOM node) for every word.
+        # The matched words are contiguous, so each line is a consecutive run.
+        for _, line_words in groupby(matched_words, key=lambda w: (w[5], w[6])):
+            line_words = list(line_words)
+            x0 = min(w[0] for w in line_words)
+            y0 = min(w[1] for w in line_words)
+            annotations.append({
+                "page": page_num + 1,
+                "x": x0,
+                "y": y0,
+                "width": max(w[2] for w in line_words) - x0,
+                "height": max(w[3] for w in line_words) - y0,
+                "color": color, 
+                "quote": quote # Store quote for reference
+            })
+
+    # Fast path: the prompt asks for exact quotes, so most of them can be found
+    # with a plain substring search and need no fuzzy matching
+    found = set()
+    for page_num, (words, full_text_lower, word_starts) in enumerate(pages):
+        for q_idx, (quote, quote_lower, color) in enumerate(queries):
+            match_start = full_text_lower.find(quote_lower)
+            while match_start != -1:
+                found.add(q_idx)
+                match_end = match_start + len(quote_lower)
+                add_match(page_num, words, word_starts, match_start, match_end, quote, color)
+                match_start = full_text_lower.find(quote_lower, match_end)
+    
+    # Only quotes that were not found verbatim on any page go through fuzzy matching
+    remaining = [q for q_idx, q in enumerate(queries) if q_idx not in found]
+    if not remaining:
+        return annotations
+    
+    # Near-identical leftovers (the same sentence cited with slightly different punctuation)
+    # are matched once through the first of them; the others reuse its boxes below.
+    # Quotes with an exact hit never get here, so a quote that is in the PDF is never
+    # replaced by a similar but different sentence
+    duplicates = _group_similar_quotes([quote_lower for _, quote_lower, _ in remaining])
+    searched = [q for r_idx, q in enumerate(remaining) if r_idx in duplicates]
+    quotes_lower = [quote_lower for _, quote_lower, _ in searched]
+    
+    for page_num, (words, full_text_lower, word_starts) in enumerate(pages):
+        # Score every quote against the page in one multithreaded call,
+        # so only quotes that pass the cutoff go on to the alignment step
+        scores = process.cdist(quotes_lower, [full_text_lower], scorer=fuzz.partial_ratio,
+                               score_cutoff=threshold, workers=-1)
+        
+        for r_idx, (quote, quote_lower, color), score in zip(duplicates, searched, scores[:, 0]):
+            if score < threshold:
+                continue
+            
+            # partial_ratio_alignment finds the best matching substring of the page
+            # and tells us where it is, so no sliding window over the words is needed
+            alignment = fuzz.partial_ratio_alignment(quote_lower, full_text_lower, score_cutoff=threshold)
+            if alignment is None:
+                continue
+            first_box = len(annotations)
+            add_match(page_num, words, word_starts, alignment.dest_start, alignment.dest_end, quote, color)
+            boxes = annotations[first_box:]
+            for dup_quote, _, dup_color in (remaining[d_idx] for d_idx in duplicates[r_idx]):
+                annotations.extend({**box, "color": dup_color, "quote": dup_quote} for box in boxes)
+    
     return annotations
 
-def pathway_viewer_component(pdf_bytes, reactions, annotations, height=900):
+def _group_similar_quotes(quotes, threshold=95):
     """
-    Custom Streamlit component to render a split view: Reactions Table + PDF Viewer.
+    Groups near-identical quotes (fuzz.ratio >= threshold).
+    Returns {index of the first quote of each group: indices of the other quotes in it},
+    in the original order.
+    """
+    groups = {}
+    grouped = set()
+    scores = process.cdist(quotes, quotes, scorer=fuzz.ratio, score_cutoff=threshold, workers=-1)
+    for i in range(len(quotes)):
+        if i in grouped:
+            continue
+        # Scores below the cutoff come back as 0, so nonzero entries are the duplicates
+        members = [j for j in (scores[i, i + 1:].nonzero()[0] + i + 1).tolist() if j not in grouped]
+        grouped.update(members)
+        groups[i] = members
+    return groups
+
+# PDFs are keyed by a BLAKE2 digest rather than Streamlit's default hashing of the raw bytes
+@st.cache_data(max_entries=8, show_spinner=False, hash_funcs={bytes: _digest})
+def _cached_annotations(pdf_bytes, quotes, _pages):
+    """
+    Memoized find_text_fuzzy, keyed on the PDF and a tuple of (text, color) quotes.
+    _pages is _extract_pages(pdf_bytes), which is left out of the cache key.
+    """
+    return find_text_fuzzy(_pages, quotes)
+
+def _submit_annotations(executor, pdf_bytes, quotes):
+    """
+    Starts the evidence search for one PDF and returns its future.
+    PyMuPDF is not thread-safe, so the PDF is parsed on the calling thread
+    and only the matching runs on the executor.
+    """
+    try:
+        pages = _extract_pages(pdf_bytes)
+    except Exception as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+    return executor.submit(_cached_annotations, pdf_bytes, quotes, pages)
+
+# Served by Streamlit at app/static/ when server.enableStaticServing is on
+_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+# The static folder is public, so uploaded papers are not kept indefinitely: files not
+# requested for _STATIC_MAX_AGE are deleted, and the oldest go first once the folder
+# holds more than _STATIC_MAX_BYTES. The sweep runs whenever a new file is written.
+_STATIC_MAX_AGE = timedelta(hours=6)
+_STATIC_MAX_BYTES = 512 * 1024 * 1024
+
+def _sweep_static(keep):
     """
-    base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
-    annotations_json = json.dumps(annotations)
-    reactions_json = json.dumps(reactions)
+    Deletes expired files from the static folder, then the least recently used ones
+    until it fits in _STATIC_MAX_BYTES. The file at path keep is never deleted.
+    """
+    files = []
+    for entry in os.scandir(_STATIC_DIR):
+        if entry.path == keep or not entry.name.endswith((".pdf", ".json", ".tmp")):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()
     
-    html_code = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <script src="https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.min.js"></script>
-        <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap" rel="stylesheet">
-        <style>
-            body {{ margin: 0; padding: 0; background-color: #f8f9fa; font-family: 'Inter', sans-serif; }}
-            .container {{ display: flex; height: {height}px; }}
+    cutoff = time.time() - _STATIC_MAX_AGE.total_seconds()
+    total = sum(size for _, size, _ in files) + os.path.getsize(keep)
+    for mtime, size, path in files:
+        if mtime >= cutoff and total <= _STATIC_MAX_BYTES:
+            break
+        if mtime >= cutoff and path.endswith(".tmp"):
+            # Still being written by another session
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def _static_url(data, suffix):
+    """
+    Writes data to the app's static folder (once per content digest) and returns
+    its URL, or None if static file serving is disabled or the file cannot be written.
+    """
+    if not st.get_option("server.enableStaticServing"):
+        return None
+    filename = f"{_digest(data)}{suffix}"
+    path = os.path.join(_STATIC_DIR, filename)
+    try:
+        # Refresh the modification time so files that are still shown survive the sweep
+        os.utime(path)
+    except FileNotFoundError:
+        # Write under a unique temporary name so a concurrent request never serves a
+        # partial file (sessions are threads of one process, so the PID is not unique)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=_STATIC_DIR, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
+        except OSError:
+            # Missing folder, read-only or full disk: the caller inlines the data instead
+            return None
+        _sweep_static(keep=path)
+    except OSError:
+        # The file is there but its mtime cannot be updated; it can still be served
+        pass
+    return f"app/static/{filename}"
+
+_VIEWER_HTML_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <script src="https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.min.js"></script>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap" rel="stylesheet">
+    <style>
+        body { margin: 0; padding: 0; background-color: #f8f9fa; font-family: 'Inter', sans-serif; }
+        .container { display: flex; height: __HEIGHT__px; }
+        
+        /* Left Panel: Reactions Table */
+        .table-panel { 
+            flex: 1; 
+            overflow-y: auto; 
+            padding: 20px; 
+            border-right: 1px solid #ddd; 
+            background: white;
+        }
+        
+        .reaction-card {
+            background: white;
+            border: 1px solid #e0e0e0;
+            border-radius: 8px;
+            padding: 16px;
+            margin-bottom: 16px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.05);
+            transition: transform 0.2s;
+        }
+        .reaction-card:hover { transform: translateY(-2px); box-shadow: 0 4px 8px rgba(0,0,0,0.1); }
+        
+        .rxn-header { font-weight: 600; color: #1a73e8; margin-bottom: 8px; display: flex; justify-content: space-between; }
+        .rxn-eq { font-family: monospace; background: #f1f3f4; padding: 8px; border-radius: 4px; margin-bottom: 12px; font-size: 0.9em; }
+        
+        .rxn-details { display: flex; gap: 20px; font-size: 0.85em; color: #5f6368; margin-bottom: 12px; }
+        .detail-col { flex: 1; }
+        
+        .evidence-btn {
+            background: #e8f0fe;
+            color: #1a73e8;
+            border: none;
+            padding: 4px 12px;
+            border-radius: 16px;
+            cursor: pointer;
+            font-size: 0.8em;
+            margin-right: 8px;
+            margin-bottom: 4px;
+            transition: background 0.2s;
+        }
+        .evidence-btn:hover { background: #d2e3fc; }
+        
+        /* Right Panel: PDF Viewer */
+        #viewerContainer { 
+            flex: 1; 
+            overflow-y: auto; 
+            background-color: #525659;
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+            padding: 20px;
+            gap: 20px;
+        }
+        
+        .pageContainer { position: relative; background-color: white; box-shadow: 0 0 10px rgba(0,0,0,0.3); }
+        .highlight { position: absolute; pointer-events: none; z-index: 1; mix-blend-mode: multiply; }
+        .highlight.active { background-color: rgba(255, 200, 0, 0.6); z-index: 2; box-shadow: 0 0 4px rgba(0,0,0,0.2); }
+        .load-error { color: white; text-align: center; margin-top: 40px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="table-panel" id="reactionList">
+            <!-- Reactions will be populated here -->
+        </div>
+        <div id="viewerContainer">
+            <!-- PDF pages will be populated here -->
+        </div>
+    </div>
+
+    __PAYLOAD__
+    <script type="module">
+        pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
+        // Static files are swept after a while, so a page left open can outlive them;
+        // rerunning the app writes them again
+        function showLoadError(err) {
+            console.error("Could not load the document:", err);
+            const message = document.createElement('p');
+            message.className = 'load-error';
+            message.textContent = 'The document could not be loaded. Rerun the app (press R) to reload it.';
+            document.getElementById('viewerContainer').replaceChildren(message);
+        }
+        
+        // The viewer data is either fetched from the static folder or inlined in #payload
+        async function loadPayload() {
+            const el = document.getElementById('payload');
+            if (el.dataset.src) {
+                const response = await fetch(new URL(el.dataset.src, document.baseURI));
+                if (!response.ok) throw new Error(`HTTP ${response.status} for ${el.dataset.src}`);
+                return response.json();
+            }
+            return JSON.parse(el.textContent);
+        }
+        let payload;
+        try {
+            payload = await loadPayload();
+        } catch (err) {
+            showLoadError(err);
+            throw err; // Nothing else can be shown without the payload
+        }
+        const {pdf: pdfSource, annotations, reactions} = payload;
+        
+        // Lookup tables so page rendering and scrollToQuote never rescan everything
+        const annByPage = new Map(); // page number -> annotations on that page
+        annotations.forEach(a => {
+            if (!annByPage.has(a.page)) annByPage.set(a.page, []);
+            annByPage.get(a.page).push(a);
+        });
+        const highlightsByQuote = new Map(); // quote -> highlight divs (filled as pages are laid out)
+        
+        // 1. Render Reactions Table
+        const reactionList = document.getElementById('reactionList');
+        // Cards are collected off-document and inserted in one go (a single reflow)
+        const cardsFragment = document.createDocumentFragment();
+        
+        reactions.forEach((rxn, index) => {
+            const card = document.createElement('div');
+            card.className = 'reaction-card';
             
-            /* Left Panel: Reactions Table */
-            .table-panel {{ 
-                flex: 1; 
-                overflow-y: auto; 
-                padding: 20px; 
-                border-right: 1px solid #ddd; 
-                background: white;
-            }}
+            // Prepare data
+            const enzyme = Array.isArray(rxn.enzyme) ? rxn.enzyme.join(", ") : (rxn.enzyme || "Unknown");
+            const subs = rxn.substrates ? rxn.substrates.join(" + ") : "";
+            const prods = rxn.products ? rxn.products.join(" + ") : "";
             
-            .reaction-card {{
-                background: white;
-                border: 1px solid #e0e0e0;
-                border-radius: 8px;
-                padding: 16px;
-                margin-bottom: 16px;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.05);
-                transition: transform 0.2s;
-            }}
-            .reaction-card:hover {{ transform: translateY(-2px); box-shadow: 0 4px 8px rgba(0,0,0,0.1); }}
+            // New fields
+            const organ = rxn.organ || "Unknown Organ";
+            const organism = rxn.organism || "Unknown Organism";
+            const type = rxn.type || "Metabolic";
+            const certainty = rxn.certainty || "Confirmed";
+            const primarySource = rxn.primary_source ? `Ref: ${rxn.primary_source}` : "";
             
-            .rxn-header {{ font-weight: 600; color: #1a73e8; margin-bottom: 8px; display: flex; justify-content: space-between; }}
-            .rxn-eq {{ font-family: monospace; background: #f1f3f4; padding: 8px; border-radius: 4px; margin-bottom: 12px; font-size: 0.9em; }}
+            // Certainty badge color
+            let certaintyColor = "#e8f0fe"; // Default Blue
+            let certaintyTextColor = "#1967d2";
+            if (certainty.toLowerCase() === "hypothetical") {
+                certaintyColor = "#fef7e0"; // Light Orange/Yellow
+                certaintyTextColor = "#b06000"; // Dark Orange
+            } else {
+                certaintyColor = "#e6f4ea"; // Greenish for confirmed
+                certaintyTextColor = "#137333";
+            }
             
-            .rxn-details {{ display: flex; gap: 20px; font-size: 0.85em; color: #5f6368; margin-bottom: 12px; }}
-            .detail-col {{ flex: 1; }}
+            // Regulation string
+            let regStr = "None";
+            if (rxn.regulation) {
+                if (typeof rxn.regulation === 'string') regStr = rxn.regulation;
+                else if (typeof rxn.regulation === 'object') {
+                    const parts = [];
+                    if (rxn.regulation.inhibitors && rxn.regulation.inhibitors.length) parts.push(`Inhibitors: ${rxn.regulation.inhibitors.length}`);
+                    if (rxn.regulation.activators && rxn.regulation.activators.length) parts.push(`Activators: ${rxn.regulation.activators.length}`);
+                    if (parts.length) regStr = parts.join(", ");
+                }
+            }
+
+            // Evidence Buttons
+            let evidenceHtml = '';
+            if (rxn.evidence && rxn.evidence.length) {
+                rxn.evidence.forEach((quote, qIdx) => {
+                    // Escape quote for title attribute (HTML context)
+                    const safeQuote = quote.replace(/"/g, '&quot;');
+                    // Pass indices to function instead of string to avoid escaping hell
+                    evidenceHtml += `<button class="evidence-btn" onclick="scrollToQuote(${index}, ${qIdx})" title="${safeQuote}">📄 Cite ${qIdx + 1}</button>`;
+                });
+            } else {
+                evidenceHtml = '<span style="color: #999; font-size: 0.8em;">No specific citation</span>';
+            }
             
-            .evidence-btn {{
-                background: #e8f0fe;
-                color: #1a73e8;
-                border: none;
-                padding: 4px 12px;
-                border-radius: 16px;
-                cursor: pointer;
-                font-size: 0.8em;
-                margin-right: 8px;
-                margin-bottom: 4px;
-                transition: background 0.2s;
-            }}
-            .evidence-btn:hover {{ background: #d2e3fc; }}
+            // Primary Source HTML
+            let sourceHtml = '';
+            if (primarySource) {
+                sourceHtml = `<div style="font-size: 0.8em; color: #5f6368; margin-top: 4px; font-style: italic;">${primarySource}</div>`;
+            }
+
+            card.innerHTML = `
+                <div class="rxn-header">
+                    <span>${rxn.id || 'R'+(index+1)}</span>
+                    <span style="font-weight: 400; font-size: 0.9em;">${enzyme}</span>
+                </div>
+                
+                <div style="display: flex; gap: 8px; margin-bottom: 8px; flex-wrap: wrap;">
+                    <span style="background: #f1f3f4; color: #3c4043; padding: 2px 8px; border-radius: 12px; font-size: 0.75em; font-weight: 600;">${type}</span>
+                    <span style="background: ${certaintyColor}; color: ${certaintyTextColor}; padding: 2px 8px; border-radius: 12px; font-size: 0.75em; font-weight: 600;">${certainty}</span>
+                    <span style="background: #fce8e6; color: #c5221f; padding: 2px 8px; border-radius: 12px; font-size: 0.75em; font-weight: 600;">${organ}</span>
+                    <span style="background: #e8f0fe; color: #1967d2; padding: 2px 8px; border-radius: 12px; font-size: 0.75em; font-weight: 600;">${organism}</span>
+                </div>
+
+                <div class="rxn-eq">${subs} ➝ ${prods}</div>
+                <div class="rxn-details">
+                    <div class="detail-col"><strong>Regulation:</strong><br>${regStr}</div>
+                </div>
+                ${sourceHtml}
+                <div style="margin-top: 8px;">
+                    ${evidenceHtml}
+                </div>
+            `;
+            cardsFragment.appendChild(card);
+        });
+        reactionList.appendChild(cardsFragment);
+
+        // 2. Render PDF
+        // Pages start as empty, correctly sized placeholders and are only drawn when they
+        // come within a viewport of the visible area, so the first page appears right away
+        const scale = 1.2; // Slightly smaller for split view
+        const MAX_CONCURRENT_RENDERS = 3;
+        const container = document.getElementById('viewerContainer');
+        const pageRenders = new Map(); // pageNum -> promise resolved once the page is drawn
+        const renderQueue = [];
+        let activeRenders = 0;
+        let pdfDoc = null;
+        
+        function pumpRenderQueue() {
+            while (activeRenders < MAX_CONCURRENT_RENDERS && renderQueue.length) {
+                const job = renderQueue.shift();
+                activeRenders++;
+                job().finally(() => {
+                    activeRenders--;
+                    pumpRenderQueue();
+                });
+            }
+        }
+        
+        async function drawPage(pageNum) {
+            const page = await pdfDoc.getPage(pageNum);
+            const viewport = page.getViewport({scale: scale});
+            const pageDiv = document.getElementById('page-' + pageNum);
             
-            /* Right Panel: PDF Viewer */
-            #viewerContainer {{ 
-                flex: 1; 
-                overflow-y: auto; 
-                background-color: #525659;
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                padding: 20px;
-                gap: 20px;
-            }}
+            const canvas = document.createElement('canvas');
+            const context = canvas.getContext('2d');
+            canvas.height = viewport.height;
+            canvas.width = viewport.width;
+            pageDiv.insertBefore(canvas, pageDiv.firstChild);
             
-            .pageContainer {{ position: relative; background-color: white; box-shadow: 0 0 10px rgba(0,0,0,0.3); }}
-            .highlight {{ position: absolute; pointer-events: none; z-index: 1; mix-blend-mode: multiply; }}
-            .highlight.active {{ background-color: rgba(255, 200, 0, 0.6); z-index: 2; box-shadow: 0 0 4px rgba(0,0,0,0.2); }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="table-panel" id="reactionList">
-                <!-- Reactions will be populated here -->
-            </div>
-            <div id="viewerContainer">
-                <!-- PDF pages will be populated here -->
-            </div>
-        </div>
-
-        <script>
-            pdfjsLib.GlobalWorkerOptions.workerSrc = 'https://cdnjs.cloudflare.com/ajax/libs/pdf.js/3.11.174/pdf.worker.min.js';
-            const pdfData = atob("{base64_pdf}");
-            const annotations = {annotations_json};
-            const reactions = {reactions_json};
+            await page.render({canvasContext: context, viewport: viewport}).promise;
+        }
+        
+        function renderPage(pageNum) {
+            if (!pageRenders.has(pageNum)) {
+                pageRenders.set(pageNum, new Promise((resolve, reject) => {
+                    renderQueue.push(() => drawPage(pageNum).then(resolve, reject));
+                    pumpRenderQueue();
+                }));
+            }
+            return pageRenders.get(pageNum);
+        }
+        
+        const pageObserver = new IntersectionObserver((entries) => {
+            entries.forEach(entry => {
+                if (entry.isIntersecting) {
+                    pageObserver.unobserve(entry.target);
+                    renderPage(Number(entry.target.dataset.pageNum));
+                }
+            });
+        }, {root: container, rootMargin: '100% 0px'});
+        
+        async function renderPdf() {
+            // Relative static URLs must be resolved against the app, not about:srcdoc
+            const loadingTask = pdfjsLib.getDocument(pdfSource.url
+                ? {url: new URL(pdfSource.url, document.baseURI).href}
+                : {data: atob(pdfSource.data)});
+            pdfDoc = await loadingTask.promise;
             
-            // 1. Render Reactions Table
-            const reactionList = document.getElementById('reactionList');
+            // Page sizes are needed up front so placeholders keep the scroll layout stable
+            const pageNums = Array.from({length: pdfDoc.numPages}, (_, i) => i + 1);
+            const pages = await Promise.all(pageNums.map(pageNum => pdfDoc.getPage(pageNum)));
             
-            reactions.forEach((rxn, index) => {{
-                const card = document.createElement('div');
-                card.className = 'reaction-card';
-                
-                // Prepare data
-                const enzyme = Array.isArray(rxn.enzyme) ? rxn.enzyme.join(", ") : (rxn.enzyme || "Unknown");
-                const subs = rxn.substrates ? rxn.substrates.join(" + ") : "";
-                const prods = rxn.products ? rxn.products.join(" + ") : "";
-                
-                // New fields
-                const organ = rxn.organ || "Unknown Organ";
-                const organism = rxn.organism || "Unknown Organism";
-                const type = rxn.type || "Metabolic";
-                const certainty = rxn.certainty || "Confirmed";
-                const primarySource = rxn.primary_source ? `Ref: ${{rxn.primary_source}}` : "";
+            // Placeholders (and their highlights) are built off-document, then inserted at once
+            const pagesFragment = document.createDocumentFragment();
+            const pageDivs = pages.map((page, i) => {
+                const pageNum = pageNums[i];
+                const viewport = page.getViewport({scale: scale});
                 
-                // Certainty badge color
-                let certaintyColor = "#e8f0fe"; // Default Blue
-                let certaintyTextColor = "#1967d2";
-                if (certainty.toLowerCase() === "hypothetical") {{
-                    certaintyColor = "#fef7e0"; // Light Orange/Yellow
-                    certaintyTextColor = "#b06000"; // Dark Orange
-                }} else {{
-                    certaintyColor = "#e6f4ea"; // Greenish for confirmed
-                    certaintyTextColor = "#137333";
-                }}
+                const pageDiv = document.createElement('div');
+                pageDiv.className = 'pageContainer';
+                pageDiv.style.width = viewport.width + 'px';
+                pageDiv.style.height = viewport.height + 'px';
+                pageDiv.id = 'page-' + pageNum;
+                pageDiv.dataset.pageNum = pageNum;
                 
-                // Regulation string
-                let regStr = "None";
-                if (rxn.regulation) {{
-                    if (typeof rxn.regulation === 'string') regStr = rxn.regulation;
-                    else if (typeof rxn.regulation === 'object') {{
-                        const parts = [];
-                        if (rxn.regulation.inhibitors && rxn.regulation.inhibitors.length) parts.push(`Inhibitors: ${{rxn.regulation.inhibitors.length}}`);
-                        if (rxn.regulation.activators && rxn.regulation.activators.length) parts.push(`Activators: ${{rxn.regulation.activators.length}}`);
-                        if (parts.length) regStr = parts.join(", ");
-                    }}
-                }}
-
-                // Evidence Buttons
-                let evidenceHtml = '';
-                if (rxn.evidence && rxn.evidence.length) {{
-                    rxn.evidence.forEach((quote, qIdx) => {{
-                        // Escape quote for title attribute (HTML context)
-                        const safeQuote = quote.replace(/"/g, '&quot;');
-                        // Pass indices to function instead of string to avoid escaping hell
-                        evidenceHtml += `<button class="evidence-btn" onclick="scrollToQuote(${{index}}, ${{qIdx}})" title="${{safeQuote}}">📄 Cite ${{qIdx + 1}}</button>`;
-                    }});
-                }} else {{
-                    evidenceHtml = '<span style="color: #999; font-size: 0.8em;">No specific citation</span>';
-                }}
-                
-                // Primary Source HTML
-                let sourceHtml = '';
-                if (primarySource) {{
-                    sourceHtml = `<div style="font-size: 0.8em; color: #5f6368; margin-top: 4px; font-style: italic;">${{primarySource}}</div>`;
-                }}
-
-                card.innerHTML = `
-                    <div class="rxn-header">
-                        <span>${{rxn.id || 'R'+(index+1)}}</span>
-                        <span style="font-weight: 400; font-size: 0.9em;">${{enzyme}}</span>
-                    </div>
+                // Add highlights (they do not depend on the canvas, so scrollToQuote
+                // can find them before the page has been drawn)
+                const pageAnnotations = annByPage.get(pageNum) || [];
+                pageAnnotations.forEach(ann => {
+                    const div = document.createElement('div');
+                    div.className = 'highlight';
+                    div.style.left = (ann.x * scale) + 'px';
+                    div.style.top = (ann.y * scale) + 'px';
+                    div.style.width = (ann.width * scale) + 'px';
+                    div.style.height = (ann.height * scale) + 'px';
+                    div.style.backgroundColor = ann.color;
+                    pageDiv.appendChild(div);
                     
-                    <div style="display: flex; gap: 8px; margin-bottom: 8px; flex-wrap: wrap;">
-                        <span style="background: #f1f3f4; color: #3c4043; padding: 2px 8px; border-radius: 12px; font-size: 0.75em; font-weight: 600;">${{type}}</span>
-                        <span style="background: ${{certaintyColor}}; color: ${{certaintyTextColor}}; padding: 2px 8px; border-radius: 12px; font-size: 0.75em; font-weight: 600;">${{certainty}}</span>
-                        <span style="background: #fce8e6; color: #c5221f; padding: 2px 8px; border-radius: 12px; font-size: 0.75em; font-weight: 600;">${{organ}}</span>
-                        <span style="background: #e8f0fe; color: #1967d2; padding: 2px 8px; border-radius: 12px; font-size: 0.75em; font-weight: 600;">${{organism}}</span>
-                    </div>
-
-                    <div class="rxn-eq">${{subs}} ➝ ${{prods}}</div>
-                    <div class="rxn-details">
-                        <div class="detail-col"><strong>Regulation:</strong><br>${{regStr}}</div>
-                    </div>
-                    ${{sourceHtml}}
-                    <div style="margin-top: 8px;">
-                        ${{evidenceHtml}}
-                    </div>
-                `;
-                reactionList.appendChild(card);
-            }});
-
-            // 2. Render PDF
-            async function renderPdf() {{
-                const loadingTask = pdfjsLib.getDocument({{data: pdfData}});
-                const pdf = await loadingTask.promise;
-                const container = document.getElementById('viewerContainer');
+                    if (!highlightsByQuote.has(ann.quote)) highlightsByQuote.set(ann.quote, []);
+                    highlightsByQuote.get(ann.quote).push(div);
+                });
                 
-                for (let pageNum = 1; pageNum <= pdf.numPages; pageNum++) {{
-                    const page = await pdf.getPage(pageNum);
-                    const scale = 1.2; // Slightly smaller for split view
-                    const viewport = page.getViewport({{scale: scale}});
-                    
-                    const pageDiv = document.createElement('div');
-                    pageDiv.className = 'pageContainer';
-                    pageDiv.style.width = viewport.width + 'px';
-                    pageDiv.style.height = viewport.height + 'px';
-                    pageDiv.id = 'page-' + pageNum;
-                    
-                    const canvas = document.createElement('canvas');
-                    const context = canvas.getContext('2d');
-                    canvas.height = viewport.height;
-                    canvas.width = viewport.width;
-                    
-                    pageDiv.appendChild(canvas);
-                    container.appendChild(pageDiv);
-                    
-                    await page.render({{canvasContext: context, viewport: viewport}}).promise;
-                    
-                    // Add highlights
-                    const pageAnnotations = annotations.filter(a => a.page === pageNum);
-                    pageAnnotations.forEach(ann => {{
-                        const div = document.createElement('div');
-                        div.className = 'highlight';
-                        div.dataset.quote = ann.quote; // Store quote for lookup
-                        div.style.left = (ann.x * scale) + 'px';
-                        div.style.top = (ann.y * scale) + 'px';
-                        div.style.width = (ann.width * scale) + 'px';
-                        div.style.height = (ann.height * scale) + 'px';
-                        div.style.backgroundColor = ann.color;
-                        pageDiv.appendChild(div);
-                    }});
-                }}
-            }}
-            renderPdf();
-
-            // 3. Scroll Function
-            window.scrollToQuote = function(rIdx, eIdx) {{
-                // Retrieve quote from reactions object using indices
-                if (!reactions[rIdx] || !reactions[rIdx].evidence[eIdx]) {{
-                    console.error("Quote not found for indices:", rIdx, eIdx);
-                    return;
-                }}
-                const quote = reactions[rIdx].evidence[eIdx];
-                
-                // Find annotations matching this quote
-                // We match loosely on the quote text stored in dataset
-                const highlights = document.querySelectorAll('.highlight');
-                let target = null;
+                pagesFragment.appendChild(pageDiv);
+                return pageDiv;
+            });
+            container.appendChild(pagesFragment);
+            pageDivs.forEach(pageDiv => pageObserver.observe(pageDiv));
+        }
+        renderPdf().catch(showLoadError);
+
+        // 3. Scroll Function
+        let activeHighlights = [];
+        window.scrollToQuote = function(rIdx, eIdx) {
+            // Retrieve quote from reactions object using indices
+            if (!reactions[rIdx] || !reactions[rIdx].evidence[eIdx]) {
+                console.error("Quote not found for indices:", rIdx, eIdx);
+                return;
+            }
+            const quote = reactions[rIdx].evidence[eIdx];
+            
+            // Find the highlights drawn for this quote
+            const quoteHighlights = highlightsByQuote.get(quote) || [];
+            const target = quoteHighlights[0];
+            
+            if (target) {
+                // Start drawing the target page now rather than waiting for the observer
+                renderPage(Number(target.parentElement.dataset.pageNum));
                 
-                for (let h of highlights) {{
-                    if (h.dataset.quote === quote) {{
-                        target = h;
-                        break;
-                    }}
-                }}
+                // Scroll container to this element
+                target.scrollIntoView({behavior: 'smooth', block: 'center'});
                 
-                if (target) {{
-                    // Scroll container to this element
-                    target.scrollIntoView({{behavior: 'smooth', block: 'center'}});
-                    
-                    // Add active class for visual feedback
-                    document.querySelectorAll('.highlight.active').forEach(el => el.classList.remove('active'));
-                    // Highlight all words for this quote
-                    for (let h of highlights) {{
-                        if (h.dataset.quote === quote) {{
-                            h.classList.add('active');
-                        }}
-                    }}
-                }} else {{
-                    console.log("Quote highlight not found in PDF:", quote);
-                }}
-            }};
-        </script>
-    </body>
-    </html>
+                // Add active class for visual feedback
+                activeHighlights.forEach(el => el.classList.remove('active'));
+                // Highlight all lines for this quote
+                quoteHighlights.forEach(h => h.classList.add('active'));
+                activeHighlights = quoteHighlights;
+            } else {
+                console.log("Quote highlight not found in PDF:", quote);
+            }
+        };
+    </script>
+</body>
+</html>
+"""
+
+def viewer_payload(pdf_bytes, reactions, annotations):
+    """
+    Serializes everything pathway_viewer_component shows (PDF, reactions, annotations) to JSON bytes.
     """
+    # Let pdf.js fetch the PDF from the static folder; inline it as base64 only when
+    # static file serving is disabled
+    pdf_url = _static_url(pdf_bytes, ".pdf")
+    pdf_source = {'url': pdf_url} if pdf_url else {'data': base64.b64encode(pdf_bytes).decode('utf-8')}
+    return orjson.dumps({'pdf': pdf_source, 'annotations': annotations, 'reactions': reactions})
+
+def pathway_viewer_component(payload_json, height=900):
+    """
+    Custom Streamlit component to render a split view: Reactions Table + PDF Viewer.
+    payload_json is the output of viewer_payload.
+    """
+    # Keep the data out of the HTML when it can be served as a file, so the markup stays
+    # small and identical across reruns
+    payload_url = _static_url(payload_json, ".json")
+    if payload_url:
+        payload_tag = f'<script id="payload" type="application/json" data-src="{payload_url}"></script>'
+    else:
+        # "</" is escaped so quotes containing "</script>" cannot end the tag early
+        payload_text = payload_json.decode('utf-8').replace("</", "<\\/")
+        payload_tag = f'<script id="payload" type="application/json">{payload_text}</script>'
+    
+    html_code = _VIEWER_HTML_TEMPLATE.replace('__HEIGHT__', str(height)).replace('__PAYLOAD__', payload_tag)
     components.html(html_code, height=height, scrolling=False) # Scrolling handled inside component
 
+# Common cofactors to exclude from visualization to prevent "hairballs"
+_EXCLUDED_METABOLITES = frozenset({
+    'h2o', 'water', 'h+', 'proton', 'o2', 'oxygen', 'co2', 
+    'atp', 'adp', 'amp', 'nad+', 'nadh', 'nadp+', 'nadph', 
+    'pi', 'phosphate', 'ppi', 'coa', 'coenzyme a'
+})
+
+def _metabolite_id(name):
+    """Stable DOT node id for a metabolite (the built-in hash() is randomized per process)."""
+    return "met_" + hashlib.blake2b(name.encode(), digest_size=6).hexdigest()
+
+@st.cache_data(max_entries=8, show_spinner=False)
 def generate_graphviz_dot(json_data):
     try:
         data = json_data if isinstance(json_data, dict) else json.loads(json_data)
         
+        # Write straight into one buffer instead of collecting lines and joining them
+        buf = io.StringIO()
+        w = buf.write
+        
         # Graph settings for better layout
-        dot = ['digraph MetabolicPathway {']
-        dot.append('  rankdir=LR;') # Left-to-Right flow
-        dot.append('  nodesep=0.6;')
-        dot.append('  ranksep=0.8;')
-        dot.append('  splines=ortho;') # Orthogonal lines for cleaner look
-        dot.append('  overlap=false;')
+        w('digraph MetabolicPathway {\n')
+        w('  rankdir=LR;\n') # Left-to-Right flow
+        w('  nodesep=0.6;\n')
+        w('  ranksep=0.8;\n')
+        w('  splines=ortho;\n') # Orthogonal lines for cleaner look
+        w('  overlap=false;\n')
         
         # Styles
-        dot.append('  node [fontname="Helvetica", fontsize=10];')
-        dot.append('  edge [fontname="Helvetica", fontsize=9];')
+        w('  node [fontname="Helvetica", fontsize=10];\n')
+        w('  edge [fontname="Helvetica", fontsize=9];\n')
         
-        # Common cofactors to exclude from visualization to prevent "hairballs"
-        exclude_metabolites = {
-            'h2o', 'water', 'h+', 'proton', 'o2', 'oxygen', 'co2', 
-            'atp', 'adp', 'amp', 'nad+', 'nadh', 'nadp+', 'nadph', 
-            'pi', 'phosphate', 'ppi', 'coa', 'coenzyme a'
-        }
+        # Metabolite node ids already declared; later edges only reference them
+        seen_nodes = set()
 
         if 'reactions' in data:
             for i, rxn in enumerate(data['reactions']):
@@ -425,36 +736,238 @@ def generate_graphviz_dot(json_data):
                 rxn_id = f"rxn_{i}"
                 rxn_label = enzyme_clean
                 # Reaction node style (small ellipse or diamond)
-                dot.append(f'  {rxn_id} [shape=ellipse, style=filled, fillcolor="#fff9c4", label="{rxn_label}", fontsize=8];')
+                w(f'  {rxn_id} [shape=ellipse, style=filled, fillcolor="#fff9c4", label="{rxn_label}", fontsize=8];\n')
 
                 # Edges: Substrate -> Reaction Node
                 for s_full in substrates:
                     s_clean = smart_clean_name(s_full)
-                    if s_clean.lower() in exclude_metabolites:
+                    if s_clean.lower() in _EXCLUDED_METABOLITES:
                         continue
                         
-                    s_id = "met_" + str(abs(hash(s_clean)))
-                    # Metabolite node style (box)
-                    dot.append(f'  {s_id} [shape=box, style=filled, fillcolor="#e1f5fe", label="{s_clean}"];')
-                    dot.append(f'  {s_id} -> {rxn_id};')
+                    s_id = _metabolite_id(s_clean)
+                    if s_id not in seen_nodes:
+                        seen_nodes.add(s_id)
+                        # Metabolite node style (box)
+                        w(f'  {s_id} [shape=box, style=filled, fillcolor="#e1f5fe", label="{s_clean}"];\n')
+                    w(f'  {s_id} -> {rxn_id};\n')
 
                 # Edges: Reaction Node -> Product
                 for p_full in products:
                     p_clean = smart_clean_name(p_full)
-                    if p_clean.lower() in exclude_metabolites:
+                    if p_clean.lower() in _EXCLUDED_METABOLITES:
                         continue
                         
-                    p_id = "met_" + str(abs(hash(p_clean)))
-                    # Metabolite node style (box)
-                    dot.append(f'  {p_id} [shape=box, style=filled, fillcolor="#e1f5fe", label="{p_clean}"];')
-                    dot.append(f'  {rxn_id} -> {p_id};')
+                    p_id = _metabolite_id(p_clean)
+                    if p_id not in seen_nodes:
+                        seen_nodes.add(p_id)
+                        # Metabolite node style (box)
+                        w(f'  {p_id} [shape=box, style=filled, fillcolor="#e1f5fe", label="{p_clean}"];\n')
+                    w(f'  {rxn_id} -> {p_id};\n')
 
-        dot.append('}')
-        return "\n".join(dot)
+        w('}')
+        return buf.getvalue()
     except Exception as e:
         st.error(f"Error generating Graphviz diagram: {e}")
         return None
 
+def _run_graphviz(cmd, source):
+    """Runs a Graphviz command on DOT source and returns its output, raising dot's own error message."""
+    result = subprocess.run(cmd, input=source.encode('utf-8'), capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip()
+                           or f"{cmd[0]} exited with status {result.returncode}")
+    return result.stdout
+
+# Rendering forks Graphviz, so identical graphs are served from memory on reruns
+@st.cache_data(max_entries=32, show_spinner=False)
+def _layout_dot(dot_code):
+    """
+    Runs dot's layout once and returns the graph as DOT with node and edge positions filled in.
+    """
+    return _run_graphviz(['dot', '-Tdot'], dot_code).decode('utf-8')
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _render_dot(layout, fmt, dpi=None):
+    """
+    Draws a graph laid out by _layout_dot in the given Graphviz output format and returns the bytes.
+    neato -n2 keeps the existing positions, so layout (the expensive step) is not repeated per format.
+    dpi is passed as a graph attribute (-Gdpi) instead of being written into the source.
+    PNGs are recompressed before caching (when small enough), so the smaller file is what gets served.
+    """
+    cmd = ['neato', '-n2', f'-T{fmt}']
+    if dpi:
+        cmd.append(f'-Gdpi={dpi}')
+    data = _run_graphviz(cmd, layout)
+    if fmt == 'png':
+        data = _optimize_png(data)
+    return data
+
+def _request_png():
+    """Button callback: render the high-res PNG from now on."""
+    st.session_state.want_png = True
+
+# Recompressing decodes the whole bitmap (4 bytes per pixel), so larger renders are served
+# as Graphviz wrote them
+_OPTIMIZE_PNG_MAX_PIXELS = 40_000_000
+
+def _optimize_png(png_bytes):
+    """
+    Losslessly recompresses a PNG (Graphviz writes them with fast, light compression).
+    Returns png_bytes unchanged when the image is too large or Pillow cannot re-encode it.
+    """
+    # Width and height are the first fields of the IHDR chunk, right after the signature
+    width = int.from_bytes(png_bytes[16:20], 'big')
+    height = int.from_bytes(png_bytes[20:24], 'big')
+    if width * height > _OPTIMIZE_PNG_MAX_PIXELS:
+        return png_bytes
+    out = io.BytesIO()
+    try:
+        with Image.open(io.BytesIO(png_bytes)) as img:
+            # Carry over the pHYs chunk so the 300 DPI setting survives the re-encode
+            save_args = {'dpi': img.info['dpi']} if 'dpi' in img.info else {}
+            img.save(out, 'PNG', optimize=True, **save_args)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Recompression only shrinks the download; it must never cost the PNG itself
+        return png_bytes
+    return out.getvalue()
+
+def _join_list(value, sep=", "):
+    """Joins list fields into a single display string (skipping nulls); other values pass through."""
+    if not isinstance(value, list):
+        return value
+    return sep.join(item if isinstance(item, str) else str(item) for item in value if item is not None)
+
+_REGULATION_LABELS = (('Inhibitors', 'inhibitors'), ('Activators', 'activators'))
+
+def _format_regulator(item):
+    """'regulator (effect)' for regulator objects; other items pass through to _join_list."""
+    if isinstance(item, dict):
+        return f"{item.get('regulator', 'Unknown')} ({item.get('effect', '')})"
+    return item
+
+def _format_regulation(reg):
+    """Flattens a reaction's regulation dict into 'Inhibitors: ...; Activators: ...'."""
+    if not isinstance(reg, dict):
+        return ""
+    parts = []
+    for label, key in _REGULATION_LABELS:
+        # Regulators can be a list of names or of {'regulator', 'effect'} objects;
+        # _join_list skips nulls and stringifies anything else
+        items = reg.get(key)
+        if isinstance(items, list):
+            items = _join_list([_format_regulator(item) for item in items])
+        if items:
+            parts.append(f"{label}: {items}")
+    return "; ".join(parts)
+
+# Reaction fields shown in the table, in the order of the prompt's JSON schema
+_DISPLAY_KEYS = ('id', 'type', 'certainty', 'organ', 'organism', 'primary_source',
+                 'substrates', 'products', 'enzyme', 'cofactors', 'reversible',
+                 'regulation', 'compartment', 'evidence')
+# Every column is text: the model mixes types within a field (e.g. reversible as
+# true/false/"unknown"), which Arrow cannot infer a single column type for
+_REACTIONS_SCHEMA = pa.schema([(key, pa.string()) for key in _DISPLAY_KEYS])
+# Shown instead of an empty cell when the model leaves these out
+_DISPLAY_DEFAULTS = {'type': "Unknown", 'organ': "Unknown", 'organism': "Unknown", 'certainty': "Unknown"}
+# How each field is flattened for display (enzyme can be list or string); other fields pass through
+_FORMATTERS = {
+    'substrates': _join_list,
+    'products': _join_list,
+    'cofactors': _join_list,
+    'enzyme': _join_list,
+    'regulation': _format_regulation,
+    'evidence': lambda v: _join_list(v, " | "),
+}
+
+def _format_field(key, value):
+    if value is None:
+        return _DISPLAY_DEFAULTS.get(key)
+    # Fields without a formatter can still be lists (e.g. alternative compartments)
+    value = _FORMATTERS.get(key, _join_list)(value)
+    return value if isinstance(value, str) else str(value)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _format_reactions(reactions_json):
+    """
+    Flattens the reactions (given as a JSON string) into an Arrow table for st.dataframe.
+    Only the display fields are copied, so large unused fields are never duplicated.
+    """
+    formatted_reactions = [
+        {key: _format_field(key, rxn.get(key)) for key in _DISPLAY_KEYS}
+        for rxn in json.loads(reactions_json)
+    ]
+    return pa.Table.from_pylist(formatted_reactions, schema=_REACTIONS_SCHEMA)
+
+# Files API uploads are deleted after 48 hours, so cached handles must expire before that
+@st.cache_resource(ttl=timedelta(hours=47), show_spinner=False)
+def _upload_pdf(pdf_hash, _pdf_bytes):
+    """
+    Uploads a PDF to the Gemini Files API once per content digest and returns a Part
+    referencing it, instead of inlining the base64-encoded file in every request.
+    """
+    uploaded = client.files.upload(file=io.BytesIO(_pdf_bytes), config={'mime_type': 'application/pdf'})
+    return types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type)
+
+class _ResponseError(ValueError):
+    """Raised when a model response has no parseable JSON block; keeps the raw text for debugging."""
+    def __init__(self, message, text):
+        super().__init__(message)
+        self.text = text
+
+def _extract_json_block(full_text):
+    """
+    Returns the JSON string between the first pair of triple backticks, falling back to the
+    span from the first { to the last }, or an empty string if neither is found.
+    """
+    # Two forward scans instead of a backtracking regex over the whole response
+    fence_start = full_text.find('```')
+    fence_end = full_text.find('```', fence_start + 3) if fence_start != -1 else -1
+    if fence_end != -1:
+        return full_text[fence_start + 3:fence_end].removeprefix('json').strip()
+    start_idx = full_text.find('{')
+    end_idx = full_text.rfind('}')
+    if start_idx != -1 and end_idx != -1:
+        return full_text[start_idx:end_idx+1]
+    return ""
+
+# Responses are persisted on disk, keyed on model, prompt and PDF digests, so regenerating
+# on the same papers does not call the paid API again, even after a restart. Only responses
+# with a parseable JSON block are kept: the function raises otherwise, and exceptions are
+# never cached, so the next click retries. Streamlit ignores ttl for persisted caches;
+# max_entries only bounds the in-memory copies, so the files under ~/.streamlit/cache are
+# removed with the "Clear cached responses" button instead.
+@st.cache_data(persist="disk", max_entries=32, show_spinner=False)
+def _cached_generate(model, prompt, pdf_hashes, _pdf_bytes, _chunk_queue):
+    """
+    Uploads the PDFs, streams the model response and returns its full text. Every streamed
+    chunk is also put on _chunk_queue so the caller can display progress; on a cache hit
+    nothing is streamed. Neither underscore argument is part of the cache key. Raises
+    _ResponseError if the response has no parseable JSON block.
+    """
+    # Uploads are network-bound, so run them concurrently
+    with ThreadPoolExecutor(max_workers=len(_pdf_bytes)) as executor:
+        contents = list(executor.map(_upload_pdf, pdf_hashes, _pdf_bytes))
+    contents.append(prompt)
+    
+    parts = []
+    for chunk in client.models.generate_content_stream(model=model, contents=contents):
+        if chunk.text:
+            parts.append(chunk.text)
+        _chunk_queue.put(chunk)
+    full_text = "".join(parts)
+    
+    json_str = _extract_json_block(full_text)
+    if not json_str:
+        raise _ResponseError("No JSON block found in response.", full_text)
+    try:
+        orjson.loads(json_str)
+    except orjson.JSONDecodeError as e:
+        raise _ResponseError(f"JSON Parsing Error: {e}", full_text) from e
+    return full_text
+
+# Seconds between redraws of the streamed response preview
+_STREAM_UPDATE_INTERVAL = 0.5
+
 uploaded_files = st.file_uploader("Choose PDF file(s)", type="pdf", accept_multiple_files=True)
 
 if uploaded_files:
@@ -465,20 +978,21 @@ if uploaded_files:
         st.session_state.full_text = None
     if "all_pdf_bytes" not in st.session_state:
         st.session_state.all_pdf_bytes = []
+    if "want_png" not in st.session_state:
+        st.session_state.want_png = False
+    if "annotations_cache" not in st.session_state:
+        # (PDF digest, evidence items) -> (annotations, viewer payload) for the current analysis
+        st.session_state.annotations_cache = {}
+    
+    st.button("Clear cached responses", on_click=_cached_generate.clear,
+              help="Forget stored model responses so the next run asks the model again. "
+                   "The cache is shared, so this clears it for every user of the app.")
     
     # Check if we need to run analysis (button click)
     if st.button("Generate Reconstruction"):
         with st.spinner("Analyzing PDF(s) and reconstructing pathway..."):
             try:
-                contents = []
-                all_pdf_bytes = []
-                for uploaded_file in uploaded_files:
-                    pdf_bytes = uploaded_file.getvalue()
-                    all_pdf_bytes.append(pdf_bytes)
-                    contents.append(types.Part.from_bytes(
-                        data=pdf_bytes,
-                        mime_type='application/pdf',
-                    ))
+                all_pdf_bytes = [uploaded_file.getvalue() for uploaded_file in uploaded_files]
                 
                 # Store PDF bytes in session state
                 st.session_state.all_pdf_bytes = all_pdf_bytes
@@ -630,45 +1144,55 @@ If no clear citation exists, state that explicitly.
 - Keep reporting precise and limited to what’s visible  
 - If diagrams appear without labels, describe what can be interpreted and what cannot"""
                 
-                contents.append(prompt)
+                # The (possibly cached) generation runs on a worker thread and hands streamed
+                # chunks back through a queue, so the response is shown while it is generated.
+                # Streamlit elements cannot be updated from inside a cached function.
+                chunk_queue = queue.Queue()
+                stream_placeholder = st.empty()
+                chunks = []
+                last_update = 0.0
+                with ThreadPoolExecutor(max_workers=1) as executor:
 # gemini-3-pro-preview gemini-2.5-flash
-                response = client.models.generate_content(
-                    model="gemini-3-pro-preview",
-                    contents=contents
-                )
-                
-                full_text = response.text
-                st.session_state.full_text = full_text
-                
-                # Extract JSON block
-                # Try to find JSON between triple backticks
-                json_match = re.search(r'```(?:json)?\s*(.*?)```', full_text, re.DOTALL)
-                
-                json_str = ""
-                if json_match:
-                    json_str = json_match.group(1)
-                else:
-                    # Fallback: Try to find the first { and last }
-                    start_idx = full_text.find('{')
-                    end_idx = full_text.rfind('}')
-                    if start_idx != -1 and end_idx != -1:
-                        json_str = full_text[start_idx:end_idx+1]
+                    future = executor.submit(
+                        _cached_generate,
+                        "gemini-3-pro-preview",
+                        prompt,
+                        tuple(_digest(pdf_bytes) for pdf_bytes in all_pdf_bytes),
+                        tuple(all_pdf_bytes),
+                        chunk_queue
+                    )
+                    while not (future.done() and chunk_queue.empty()):
+                        try:
+                            chunk = chunk_queue.get(timeout=0.1)
+                        except queue.Empty:
+                            continue
+                        if chunk.text:
+                            chunks.append(chunk.text)
+                        tokens = chunk.usage_metadata.candidates_token_count if chunk.usage_metadata else None
+                        # Each update resends the whole text so far, so redraw at most every
+                        # _STREAM_UPDATE_INTERVAL seconds, and always after the last chunk
+                        now = time.monotonic()
+                        last_chunk = future.done() and chunk_queue.empty()
+                        if last_chunk or now - last_update >= _STREAM_UPDATE_INTERVAL:
+                            last_update = now
+                            with stream_placeholder.container():
+                                st.caption(f"Receiving response... {tokens or 0} tokens")
+                                st.text("".join(chunks))
+                stream_placeholder.empty()
                 
-                json_data = None
-                if json_str:
-                    try:
-                        json_data = json.loads(json_str)
-                        st.session_state.analysis_result = json_data
-                    except json.JSONDecodeError as e:
-                        st.error(f"JSON Parsing Error: {e}")
-                        with st.expander("View Raw Output (Debug)"):
-                            st.code(full_text)
-                else:
-                    st.warning("No JSON block found in response.")
+                try:
+                    full_text = future.result()
+                except _ResponseError as e:
+                    # Not cached, so clicking the button again asks the model again; any
+                    # earlier result in the session is left as it was
+                    st.error(str(e))
                     with st.expander("View Raw Output (Debug)"):
-                        st.code(full_text)
-                
-                st.success("Analysis Complete!")
+                        st.code(e.text)
+                else:
+                    st.session_state.full_text = full_text
+                    st.session_state.annotations_cache = {}
+                    st.session_state.analysis_result = orjson.loads(_extract_json_block(full_text))
+                    st.success("Analysis Complete!")
                 
             except Exception as e:
                 st.error(f"An error occurred: {e}")
@@ -681,38 +1205,53 @@ If no clear citation exists, state that explicitly.
         # 1. Visualization (Graphviz)
         if json_data:
             st.subheader("Pathway Visualization")
-            dot_code = generate_graphviz_dot(json_data)
+            # Canonical JSON string is a cheap, stable cache key for the DOT builder
+            dot_code = generate_graphviz_dot(json.dumps(json_data, sort_keys=True))
             if dot_code:
                 st.graphviz_chart(dot_code)
                 
-                # Download buttons
+                # Lay the graph out once, then render High-Res PNG (300 DPI) and SVG from that
+                # layout concurrently; each Graphviz process runs outside the GIL, so the wait is
+                # the slower of the two rather than their sum. A failed layout surfaces in both columns.
+                # The PNG is the expensive one, so it is only rendered once the user asks for it
+                def render(fmt, dpi=None):
+                    return _render_dot(layout_future.result(), fmt, dpi)
+                
+                png_future = None
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    layout_future = executor.submit(_layout_dot, dot_code)
+                    if st.session_state.want_png:
+                        png_future = executor.submit(render, 'png', 300)
+                    svg_future = executor.submit(render, 'svg')
+
+                # Download buttons, keyed on the graph so an unchanged graph keeps the same widgets
+                graph_key = _digest(dot_code.encode('utf-8'))
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    try:
-                        # Render High-Res PNG (300 DPI)
-                        # Inject DPI attribute into the DOT code
-                        dot_code_high_res = dot_code.replace('{', '{\n  dpi=300;', 1)
-                        graph = graphviz.Source(dot_code_high_res)
-                        png_bytes = graph.pipe(format='png')
-                        st.download_button(
-                            label="Download Graph (High-Res PNG)",
-                            data=png_bytes,
-                            file_name="pathway_graph_highres.png",
-                            mime="image/png"
-                        )
-                    except Exception as e:
-                        st.warning(f"Could not generate PNG download: {e}")
+                    if png_future is None:
+                        st.button("Prepare High-Res PNG", key="prep_png", on_click=_request_png)
+                    else:
+                        try:
+                            png_bytes = png_future.result()
+                            st.download_button(
+                                label="Download Graph (High-Res PNG)",
+                                data=png_bytes,
+                                file_name="pathway_graph_highres.png",
+                                mime="image/png",
+                                key=f"png_{graph_key}"
+                            )
+                        except Exception as e:
+                            st.warning(f"Could not generate PNG download: {e}")
                 
                 with col2:
                     try:
-                        # Render SVG
-                        graph = graphviz.Source(dot_code)
-                        svg_bytes = graph.pipe(format='svg')
+                        svg_bytes = svg_future.result()
                         st.download_button(
                             label="Download Graph (SVG)",
                             data=svg_bytes,
                             file_name="pathway_graph.svg",
-                            mime="image/svg+xml"
+                            mime="image/svg+xml",
+                            key=f"svg_{graph_key}"
                         )
                     except Exception as e:
                         st.warning(f"Could not generate SVG download: {e}")
@@ -730,23 +1269,24 @@ If no clear citation exists, state that explicitly.
             st.subheader("Pathway Details & Evidence")
             
             # Collect all evidence quotes with their certainty for annotation search
-            evidence_items = []
+            # A quote cited by several reactions is searched once, and is shown as
+            # confirmed if any of those reactions is confirmed
+            evidence_colors = {}
             for rxn in json_data['reactions']:
                 if 'evidence' in rxn:
-                    certainty = rxn.get('certainty', 'Confirmed')
                     # Determine color based on certainty
-                    # Confirmed = Yellow (rgba(255, 255, 0, 0.4))
-                    # Hypothetical = Orange (rgba(255, 165, 0, 0.5))
-                    color = "rgba(255, 255, 0, 0.4)"
-                    if certainty and certainty.lower() == "hypothetical":
-                        color = "rgba(255, 165, 0, 0.5)"
-                        
+                    color = _CERTAINTY_COLORS.get((rxn.get('certainty') or 'confirmed').lower(), _CONFIRMED_COLOR)
+                    
                     if rxn['evidence'] and isinstance(rxn['evidence'], list):
                         for quote in rxn['evidence']:
-                            evidence_items.append({
-                                'text': quote,
-                                'color': color
-                            })
+                            # Skip malformed entries (objects, nulls) rather than failing the whole view
+                            if not isinstance(quote, str):
+                                continue
+                            if evidence_colors.get(quote) != _CONFIRMED_COLOR:
+                                evidence_colors[quote] = color
+            
+            # Hashable (quote, color) pairs, so the same object doubles as a cache key
+            evidence_items = tuple(evidence_colors.items())
             
             # Create tabs for each uploaded file
             # Use session state bytes if available, otherwise try to use uploaded_files (but bytes are safer)
@@ -755,24 +1295,43 @@ If no clear citation exists, state that explicitly.
                 # Since uploaded_files persists, we can match by index
                 tabs = st.tabs([f.name for f in uploaded_files])
                 
+                # Find annotations using fuzzy search (cached per PDF and quote set)
+                # for every PDF up front, so the PDFs are searched in parallel.
+                # PDFs already searched in this session reuse their annotations and
+                # serialized viewer payload, so reruns skip both the search and the JSON dump
+                all_pdf_bytes = st.session_state.all_pdf_bytes
+                annotations_cache = st.session_state.annotations_cache
+                cache_keys = [(_digest(pdf_bytes), evidence_items) for pdf_bytes in all_pdf_bytes]
+                with ThreadPoolExecutor(max_workers=min(len(all_pdf_bytes), os.cpu_count() or 4)) as executor:
+                    annotation_futures = [None if key in annotations_cache
+                                          else _submit_annotations(executor, pdf_bytes, evidence_items)
+                                          for pdf_bytes, key in zip(all_pdf_bytes, cache_keys)]
+                
                 for i, tab in enumerate(tabs):
-                    if i < len(st.session_state.all_pdf_bytes):
+                    if i < len(all_pdf_bytes):
                         with tab:
-                            pdf_bytes = st.session_state.all_pdf_bytes[i]
+                            pdf_bytes = all_pdf_bytes[i]
                             
-                            # Find annotations using fuzzy search
-                            # Pass the list of dicts directly
-                            annotations = find_text_fuzzy(pdf_bytes, evidence_items)
+                            if cache_keys[i] in annotations_cache:
+                                annotations, payload_json = annotations_cache[cache_keys[i]]
+                                # The cached payload points at the PDF's static file; request it
+                                # again so the sweep keeps it (and rewrites it if already swept)
+                                _static_url(pdf_bytes, ".pdf")
+                            else:
+                                try:
+                                    annotations = annotation_futures[i].result()
+                                except Exception as e:
+                                    st.warning(f"Error in fuzzy search: {e}")
+                                    annotations = []
+                                payload_json = viewer_payload(pdf_bytes, json_data['reactions'], annotations)
+                                # Failed searches are not kept, so they are retried on the next rerun
+                                if annotation_futures[i].exception() is None:
+                                    annotations_cache[cache_keys[i]] = (annotations, payload_json)
                             
                             st.caption(f"Found {len(annotations)} highlights.")
                             
                             # Render unified viewer
-                            pathway_viewer_component(
-                                pdf_bytes, 
-                                json_data['reactions'],
-                                annotations, 
-                                height=800
-                            )
+                            pathway_viewer_component(payload_json, height=800)
                 
                 # 3. Metabolites & Enzymes (Supplementary)
                 # 3. Metabolites & Enzymes (Supplementary)
@@ -781,58 +1340,9 @@ If no clear citation exists, state that explicitly.
                     
                     with tab_rxn:
                         if 'reactions' in json_data:
-                            # Format reactions for display
-                            formatted_reactions = []
-                            for rxn in json_data['reactions']:
-                                formatted_rxn = rxn.copy()
-                                
-                                # Join lists into strings
-                                for key in ['substrates', 'products', 'cofactors']:
-                                    if key in formatted_rxn and isinstance(formatted_rxn[key], list):
-                                        formatted_rxn[key] = ", ".join(formatted_rxn[key])
-                                
-                                # Handle enzyme (can be list or string)
-                                if 'enzyme' in formatted_rxn and isinstance(formatted_rxn['enzyme'], list):
-                                    formatted_rxn['enzyme'] = ", ".join(formatted_rxn['enzyme'])
-
-                                # Format regulation
-                                if 'regulation' in formatted_rxn:
-                                    reg = formatted_rxn['regulation']
-                                    reg_str = ""
-                                    if isinstance(reg, dict):
-                                        inhibitors = reg.get('inhibitors', [])
-                                        activators = reg.get('activators', [])
-                                        
-                                        if inhibitors:
-                                            # Check if inhibitors is a list of strings or objects
-                                            if inhibitors and isinstance(inhibitors[0], dict):
-                                                inh_list = [f"{i.get('regulator', 'Unknown')} ({i.get('effect', '')})" for i in inhibitors]
-                                                reg_str += f"Inhibitors: {', '.join(inh_list)}; "
-                                            else:
-                                                reg_str += f"Inhibitors: {', '.join(inhibitors)}; "
-                                        
-                                        if activators:
-                                            # Check if activators is a list of strings or objects
-                                            if activators and isinstance(activators[0], dict):
-                                                act_list = [f"{a.get('regulator', 'Unknown')} ({a.get('effect', '')})" for a in activators]
-                                                reg_str += f"Activators: {', '.join(act_list)}"
-                                            else:
-                                                reg_str += f"Activators: {', '.join(activators)}"
-                                    
-                                    formatted_rxn['regulation'] = reg_str.strip('; ')
-                                
-                                # Format evidence
-                                if 'evidence' in formatted_rxn and isinstance(formatted_rxn['evidence'], list):
-                                     formatted_rxn['evidence'] = " | ".join(formatted_rxn['evidence'])
-                                
-                                # Ensure new fields are present for dataframe consistency
-                                for key in ['type', 'organ', 'organism', 'certainty', 'primary_source']:
-                                    if key not in formatted_rxn:
-                                        formatted_rxn[key] = "Unknown" if key != 'primary_source' else None
-
-                                formatted_reactions.append(formatted_rxn)
-                            
-                            st.dataframe(formatted_reactions, use_container_width=True)
+                            # The JSON string is a cheap, stable cache key for the formatted table
+                            reactions_table = _format_reactions(json.dumps(json_data['reactions']))
+                            st.dataframe(reactions_table, use_container_width=True)
                         else:
                             st.info("No reactions found.")
 
@@ -849,17 +1359,9 @@ If no clear citation exists, state that explicitly.
 
         # 4. Plain Language Explanation
         st.subheader("Explanation")
-        # Remove the JSON block from the text
-        explanation_text = re.sub(r'```json\n.*?\n```', '', full_text, flags=re.DOTALL).strip()
-        
-        # Clean up specific headers
-        # Remove "1. JSON metabolic pathway model" and "2. Plain-language explanation..."
-        # Also remove "### Final Deliverables" if present
-        explanation_text = re.sub(r'### Final Deliverables\s*', '', explanation_text, flags=re.IGNORECASE)
-        explanation_text = re.sub(r'\d+\.\s*\*\*JSON metabolic pathway model\*\*\s*', '', explanation_text, flags=re.IGNORECASE)
-        explanation_text = re.sub(r'\d+\.\s*\*\*Plain-language explanation\*\*.*?\n', '', explanation_text, flags=re.IGNORECASE)
-        # Remove just the header "Plain-language explanation" if it appears as a header
-        explanation_text = re.sub(r'### Plain-Language Explanation.*?\n', '', explanation_text, flags=re.IGNORECASE)
+        # Remove the JSON block from the text, then clean up specific headers:
+        # "1. JSON metabolic pathway model", "2. Plain-language explanation..." and "### Final Deliverables"
+        explanation_text = _HEADER_RE.sub('', _JSON_BLOCK_RE.sub('', full_text).strip())
         
         st.markdown(explanation_text)
 
@@ -869,7 +1371,8 @@ If no clear citation exists, state that explicitly.
         st.subheader("Raw Data & Debugging")
         
         with st.expander("View Raw JSON Model"):
-            st.json(json_data)
+            # Pre-formatted with orjson rather than handing the dict to st.json
+            st.code(orjson.dumps(json_data, option=orjson.OPT_INDENT_2).decode('utf-8'), language='json')
             
         with st.expander("View Full LLM Response (Debug)"):
             st.text(full_text)